@@ -6,18 +6,21 @@ from __future__ import annotations
 
 import argparse
 import dataclasses
-import http.client
+import functools
 import json
 import logging
-import re
-import subprocess
-from configparser import ConfigParser
+import math
+import os
+import threading
+import time
 from datetime import datetime
-from pathlib import Path
 from typing import TYPE_CHECKING
+from typing import IO
 from typing import Any
 
 if TYPE_CHECKING:
+    import http.client
+    from concurrent.futures import Future
     from typing import Protocol
 
     class Builder(Protocol):
@@ -31,8 +34,16 @@ if TYPE_CHECKING:
         ) -> dict[str, Any]: ...
 
 
-NEWFILE_NAME = datetime.now().strftime("brag-%Y-%m-%d.md")
+NEWFILE_NAME = "brag-{date}.md"
 DEFAULT_CONFIG_FILE = "braghook.ini"
+REQUEST_TIMEOUT = 10  # seconds, so one hung endpoint cannot stall the others
+MAX_LOGGED_BODY = 512  # bytes of an error response body kept in the log
+MAX_RETRIES = 3  # extra attempts for rate limited or transient server errors
+RETRY_BACKOFF = 0.25  # seconds before the first retry, doubled after each
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+# A POST that failed with a 5xx may still have been delivered, so only retry
+# the statuses that guarantee the request was not processed
+POST_RETRY_STATUSES = frozenset((429, 503))
 DEFAULT_FILE_TEMPLATE = """### {date}
 
 Motivation summary:
@@ -43,6 +54,44 @@ Improvements:
 
 """
 
+# Pre-encoded halves of the template around the {date} placeholder
+_TEMPLATE_HEAD, _TEMPLATE_TAIL = DEFAULT_FILE_TEMPLATE.encode("utf-8").split(b"{date}")
+
+# Template text below the date heading, for spotting unedited brag files
+_TEMPLATE_BODY = DEFAULT_FILE_TEMPLATE.partition("\n")[2].strip()
+
+# Default request headers, shared read-only by every JSON request
+JSON_HEADERS = {"content-type": "application/json"}
+
+# Reused encoder, json.dumps builds a new one per call when given options.
+# Payloads are built here and never self-referencing, skip the circular check.
+JSON_ENCODER = json.JSONEncoder(
+    separators=(",", ":"),
+    ensure_ascii=False,
+    check_circular=False,
+)
+
+# Static parts of the MSTeams AdaptiveCard, shared by every built message.
+# These are only ever serialized, never mutated.
+MSTEAMS_SENT_BY_BLOCK: dict[str, Any] = {
+    "type": "TextBlock",
+    "text": "sent by: braghook",
+    "spacing": "none",
+    "isSubtle": True,
+    "wrap": True,
+}
+MSTEAMS_CARD_ACTIONS: list[dict[str, Any]] = [
+    {
+        "type": "Action.ToggleVisibility",
+        "title": "Toggle Content",
+        "targetElements": ["contentToToggle"],
+    },
+]
+MSTEAMS_CARD_OPTIONS: dict[str, Any] = {
+    "width": "Full",
+    "entities": [],
+}
+
 
 @dataclasses.dataclass(frozen=True)
 class Config:
@@ -62,110 +111,391 @@ class Config:
     gist_id: str = ""
     openweathermap_url: str = ""
 
+    @functools.cached_property
+    def editor_argv(self) -> tuple[str, ...]:
+        """The editor_args split into arguments, computed once per Config."""
+        return tuple(self.editor_args.split())
+
+
+# Config field names and default values, shared read-only by parse and create
+CONFIG_DEFAULTS = dataclasses.asdict(Config())
 
 logger = logging.getLogger(__name__)
 
+# Idle connections keyed by scheme and host, reused across requests until closed
+_idle_connections: dict[str, list[http.client.HTTPConnection]] = {}
+_connections_lock = threading.Lock()
+
+# Parsed configs keyed by path, holding the file mtime they were parsed at
+_config_cache: dict[str, tuple[int | None, Config]] = {}
+
+
+def get_today() -> str:
+    """Return today's date as YYYY-MM-DD."""
+    # isoformat is a direct C formatter, strftime goes through the locale machinery
+    return datetime.now().date().isoformat()
+
 
 def load_config(config_file: str | None = None) -> Config:
     """Load the configuration. If no config file is given, the default is used."""
     config_file = config_file or DEFAULT_CONFIG_FILE
-    config = ConfigParser()
-    config.read(config_file)
-    default = config["DEFAULT"]
-
-    return Config(
-        workdir=default.get("workdir", fallback="."),
-        editor=default.get("editor", fallback="vim"),
-        editor_args=default.get("editor_args", fallback=""),
-        author=default.get("author", fallback="braghook"),
-        author_icon=default.get("author_icon", fallback=""),
-        discord_webhook=default.get("discord_webhook", fallback=""),
-        discord_webhook_plain=default.get("discord_webhook_plain", fallback=""),
-        msteams_webhook=default.get("msteams_webhook", fallback=""),
-        github_user=default.get("github_user", fallback=""),
-        github_pat=default.get("github_pat", fallback=""),
-        gist_id=default.get("gist_id", fallback=""),
-        openweathermap_url=default.get("openweathermap_url", fallback=""),
-    )
+    try:
+        mtime: int | None = os.stat(config_file).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+
+    # Config is frozen so the cached instance is safe to share between callers
+    cached = _config_cache.get(config_file)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    loaded = _parse_config(config_file)
+    _config_cache[config_file] = (mtime, loaded)
+    return loaded
+
+
+def clear_config_cache() -> None:
+    """Forget every loaded config so the next load reads from disk."""
+    _config_cache.clear()
+
+
+def parse_ini_defaults(text: str) -> dict[str, str]:
+    """
+    Parse the DEFAULT section of INI text into a dict with lowercased keys.
+
+    Only the subset written by create_config is supported: section headers,
+    `key = value` or `key: value` pairs, indented continuation lines, and
+    full-line `#` or `;` comments. As with ConfigParser, `%%` reads as `%`;
+    `%(name)s` references are not interpolated.
+    """
+    values: dict[str, str] = {}
+    in_default = False
+    found_default = False
+    key: str | None = None  # The key an indented line continues, if any
+    blank_lines = 0  # Kept inside a continued value, as ConfigParser does
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if not line:
+            blank_lines += 1
+            continue
+
+        if line[0] in "#;":
+            continue
+
+        if key is not None and raw_line[0].isspace():
+            values[key] += "\n" * (blank_lines + 1) + line.replace("%%", "%")
+            blank_lines = 0
+            continue
+
+        key = None
+        blank_lines = 0
+        if line[0] == "[" and line[-1] == "]":
+            in_default = line[1:-1].strip() == "DEFAULT"
+            found_default = found_default or in_default
+            continue
+
+        # The first of either delimiter splits key from value, as ConfigParser does
+        name, delimiter, value = line.partition("=")
+        if ":" in name:
+            name, delimiter, value = line.partition(":")
+
+        if in_default and delimiter:
+            key = name.strip().lower()
+            values[key] = value.strip().replace("%%", "%")
+
+    if not found_default:
+        logger.warning("No [DEFAULT] section in config, using the defaults")
+
+    return values
+
+
+def _parse_config(config_file: str) -> Config:
+    """Parse the config file. A missing file gives the default Config."""
+    try:
+        # utf-8-sig drops the BOM some editors write before [DEFAULT]
+        with open(config_file, encoding="utf-8-sig") as file:
+            values = parse_ini_defaults(file.read())
+    except FileNotFoundError:
+        values = {}
+
+    pairs = CONFIG_DEFAULTS.items()
+    return Config(**{key: values.get(key, value) for key, value in pairs})
 
 
 def create_config(config_file: str | None = None) -> None:
     """Create the config file. If no config file is given, the default is used."""
     config_file = config_file or DEFAULT_CONFIG_FILE
     # Avoid overwriting existing config
-    if Path(config_file).exists():
+    try:
+        fd = os.open(config_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    except FileExistsError:
         print(f"Config file already exists: {config_file}")
         return
 
-    config = ConfigParser()
-    config.read_dict({"DEFAULT": dataclasses.asdict(Config())})
-    with open(config_file, "w") as file:
-        config.write(file)
+    with os.fdopen(fd, "w") as file:
+        _write_config(file)
+
+
+def _write_config(file: IO[str]) -> None:
+    """Write the default config as INI text to an open file."""
+    # Same layout ConfigParser.write produces, without importing configparser
+    lines = [f"{key} = {value}\n" for key, value in CONFIG_DEFAULTS.items()]
+    file.write("[DEFAULT]\n" + "".join(lines) + "\n")
 
 
 def open_editor(config: Config, filename: str) -> None:
     """Open the editor."""
-    args = config.editor_args.split()
-    args.append(str(filename))
-    subprocess.run([config.editor, *args])
+    argv = [config.editor, *config.editor_argv, str(filename)]
+
+    if hasattr(os, "posix_spawnp"):
+        # Launches the editor without forking this interpreter, unlike spawnvp
+        pid = os.posix_spawnp(config.editor, argv, os.environ)
+        os.waitpid(pid, 0)
+
+    else:  # posix_spawnp is not available on Windows
+        import subprocess
 
+        subprocess.run(argv)
 
-def create_empty_template_file(filename: str) -> None:
-    """Create the file."""
-    with open(filename, "w") as file:
-        file.write(
-            DEFAULT_FILE_TEMPLATE.format(date=datetime.now().strftime("%Y-%m-%d"))
-        )
+
+def create_empty_template_file(filename: str, date: str | None = None) -> None:
+    """Create the file. An existing file is never overwritten."""
+    date = date or get_today()
+    try:
+        fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    except FileExistsError:
+        return
+
+    try:
+        os.write(fd, _TEMPLATE_HEAD + date.encode("utf-8") + _TEMPLATE_TAIL)
+    finally:
+        os.close(fd)
 
 
-def get_full_filename(workdir: str, filename: str | None) -> str:
+def get_full_filename(
+    workdir: str,
+    filename: str | None,
+    date: str | None = None,
+) -> str:
     """Create bragfile if it doesn't exist. NEWFILE_NAME used if filename is None."""
-    if filename:
-        filename = str(Path(workdir) / filename)
-    else:
-        filename = str(Path(workdir) / NEWFILE_NAME)
+    date = date or get_today()
+    filename = filename or NEWFILE_NAME.format(date=date)
+    # normpath drops the "./" of the default workdir, as pathlib did. The name
+    # is also the gist file key, so it must stay stable
+    filename = os.path.normpath(os.path.join(workdir, filename))
 
-    if not Path(filename).exists():
-        create_empty_template_file(filename)
+    create_empty_template_file(filename, date)
 
     return filename
 
 
 def read_file_contents(filename: str) -> str:
-    """Read the file."""
-    with open(filename) as file:
-        return file.read()
+    """Read the file as UTF-8, matching how brag files are written."""
+    # Binary read skips the text layer; decode once and normalize line endings.
+    # Undecodable bytes (a file saved in a legacy encoding) become U+FFFD
+    with open(filename, "rb") as file:
+        content = file.read().decode("utf-8", errors="replace")
+    return content.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def is_empty_brag(content: str) -> bool:
+    """Return True if content is blank or still the unedited template."""
+    content = content.strip()
+    if not content:
+        return True
+
+    heading, _, body = content.partition("\n")
+    return heading.startswith("### ") and body.strip() == _TEMPLATE_BODY
 
 
 def send_message(config: Config, content: str) -> None:
     """Send the message to any webhooks defined in config."""
+    if not content.strip():
+        logger.info("Message is empty, nothing sent to webhooks")
+        return
+
     # Define the builders here, used in the main script
-    # NOTE: The key is the config field that defines the url
-    # NOTE: The value is the function that builds the message
-    builders: dict[str, Builder] = {
-        "discord_webhook": build_discord_webhook,
-        "discord_webhook_plain": build_discord_webhook_plain,
-        "msteams_webhook": build_msteams_webhook,
-    }
+    # NOTE: Each pair is the webhook url from config and the message builder
+    builders: tuple[tuple[str, Builder], ...] = (
+        (config.discord_webhook, build_discord_webhook),
+        (config.discord_webhook_plain, build_discord_webhook_plain),
+        (config.msteams_webhook, build_msteams_webhook),
+    )
+    author = config.author
+    author_icon = config.author_icon
+
+    posts = [
+        (url, builder(author=author, author_icon=author_icon, content=content))
+        for url, builder in builders
+        if url  # Skip if the webhook is not defined in config
+    ]
+    if not posts:
+        return
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    # One worker per webhook. Every post is submitted before any result is read,
+    # so a failing webhook cannot cancel the others
+    with ThreadPoolExecutor(max_workers=len(posts)) as executor:
+        futures = {url: executor.submit(_post, url, data) for url, data in posts}
+
+    _raise_on_failure(futures)
+
+
+def _raise_on_failure(futures: dict[str, Future[None]]) -> None:
+    """Log every failed future by its target, then re-raise the first failure."""
+    errors = [(target, future.exception()) for target, future in futures.items()]
+    failures = [(target, error) for target, error in errors if error is not None]
+    for target, error in failures:
+        logger.error("Error sending to %s: %r", target, error)
+    if failures:
+        raise failures[0][1]
+
+
+def split_uri(uri: str) -> tuple[str, str, str]:
+    """Split the URI into scheme, host, and path (including any query)."""
+    from urllib.parse import urlsplit
+
+    parts = urlsplit(uri)
+    if not parts.netloc:
+        # A bare "host/path" parses as all path, so default to https
+        parts = urlsplit(f"https://{uri}")
+    path = parts.path or "/"
+    if parts.query:
+        path = f"{path}?{parts.query}"
+    return parts.scheme, parts.netloc, path
+
+
+def to_json_bytes(data: dict[str, Any]) -> bytes:
+    """Serialize the data to compact UTF-8 encoded JSON."""
+    return JSON_ENCODER.encode(data).encode("utf-8")
+
+
+def _request(
+    method: str,
+    url: str,
+    body: bytes | None = None,
+    headers: dict[str, str] | None = None,
+) -> tuple[int, bytes]:
+    """Send a request, retrying rate limited and transient server errors."""
+    retry_statuses = POST_RETRY_STATUSES if method == "POST" else RETRY_STATUSES
+    attempt = 0
+    while True:
+        status, response_body, retry_after = _send_once(method, url, body, headers)
+        if status not in retry_statuses or attempt == MAX_RETRIES:
+            return status, response_body
+
+        delay = _retry_delay(retry_after, attempt)
+        logger.debug("Retrying %s %s in %.2fs (status %d)", method, url, delay, status)
+        time.sleep(delay)
+        attempt += 1
+
+
+def _retry_delay(retry_after: str | None, attempt: int) -> float:
+    """Seconds to wait before a retry. A numeric Retry-After header wins."""
+    delay = RETRY_BACKOFF * 2**attempt
+    if retry_after is not None:
+        try:
+            header_delay = float(retry_after)
+        except ValueError:
+            pass  # HTTP-date form, fall back to the backoff
+        else:
+            if math.isfinite(header_delay):
+                delay = header_delay
+    return min(max(0.0, delay), REQUEST_TIMEOUT)
+
+
+def _send_once(
+    method: str,
+    url: str,
+    body: bytes | None = None,
+    headers: dict[str, str] | None = None,
+) -> tuple[int, bytes, str | None]:
+    """Send a request, reusing an idle connection to the host. Thread-safe."""
+    scheme, host, path = split_uri(url)
+    conn = _get_connection(scheme, host)
+    # An open socket means the request goes over a kept-alive connection, which
+    # the server may have dropped while it sat idle
+    reused = conn.sock is not None
+    written = False
+
+    try:
+        conn.request(method, path, body, headers or {})
+        written = True
+        result = _read_response(conn)
+
+    # RemoteDisconnected is a ConnectionResetError. The server may have acted on
+    # a POST once it was written, so that is only resent if writing it failed
+    except (BrokenPipeError, ConnectionResetError):
+        conn.close()
+        if not reused or (written and method == "POST"):
+            raise
+        logger.debug("Stale connection to %s, retrying on a new one", host)
+        conn = _new_connection(scheme, host)
+        result = _exchange(conn, method, path, body, headers)
+
+    except Exception:
+        conn.close()
+        raise
+
+    with _connections_lock:
+        _idle_connections.setdefault(f"{scheme}://{host}", []).append(conn)
+
+    return result
+
+
+def _exchange(
+    conn: http.client.HTTPConnection,
+    method: str,
+    path: str,
+    body: bytes | None = None,
+    headers: dict[str, str] | None = None,
+) -> tuple[int, bytes, str | None]:
+    """Send one request on the connection. The connection is closed on error."""
+    try:
+        conn.request(method, path, body, headers or {})
+        return _read_response(conn)
+
+    except Exception:
+        conn.close()
+        raise
+
+
+def _read_response(conn: http.client.HTTPConnection) -> tuple[int, bytes, str | None]:
+    """Read the status, body, and Retry-After header of the pending response."""
+    response = conn.getresponse()
+    # Always drain the response so the connection can be reused
+    return response.status, response.read(), response.getheader("Retry-After")
+
+
+def _get_connection(scheme: str, host: str) -> http.client.HTTPConnection:
+    """Take an idle connection to the host, or open a new one. Thread-safe."""
+    # Open another if all are busy so concurrent requests to the same host
+    # overlap instead of queueing
+    with _connections_lock:
+        idle = _idle_connections.get(f"{scheme}://{host}")
+        if idle:
+            return idle.pop()
+
+    return _new_connection(scheme, host)
 
-    for config_field, builder in builders.items():
-        url = getattr(config, config_field)
-        if not url:
-            continue  # Skip if the webhook is not defined in config
-        data = builder(
-            author=config.author,
-            author_icon=config.author_icon,
-            content=content,
-        )
-        _post(url=url, data=data)
 
+def _new_connection(scheme: str, host: str) -> http.client.HTTPConnection:
+    """Open a new connection to the host."""
+    import http.client
 
-def split_uri(uri: str) -> tuple[str, str]:
-    """Split the URI into host and path."""
-    uri = uri.replace("http://", "").replace("https://", "")
-    host = uri.split("/", 1)[0]
-    path = uri.replace(host, "")
-    return host, path
+    if scheme == "http":
+        return http.client.HTTPConnection(host, timeout=REQUEST_TIMEOUT)
+    return http.client.HTTPSConnection(host, timeout=REQUEST_TIMEOUT)
+
+
+def close_connections() -> None:
+    """Close all open connections."""
+    with _connections_lock:
+        for idle in _idle_connections.values():
+            for conn in idle:
+                conn.close()
+        _idle_connections.clear()
 
 
 def _post(
@@ -174,14 +504,11 @@ def _post(
     headers: dict[str, str] | None = None,
 ) -> None:
     """Post the data to the URL. Expects JSON."""
-    headers = headers or {"content-type": "application/json"}
-    host, path = split_uri(url)
+    headers = headers or JSON_HEADERS
 
-    conn = http.client.HTTPSConnection(host)
-    conn.request("POST", path, json.dumps(data), headers)
-    response = conn.getresponse()
-    if response.status not in range(200, 300):
-        logger.error("Error sending message: %s", response.read())
+    status, body = _request("POST", url, to_json_bytes(data), headers)
+    if not 200 <= status < 300:
+        logger.error("Error sending message: %s %s", status, body[:MAX_LOGGED_BODY])
 
 
 def _get(
@@ -189,16 +516,13 @@ def _get(
     headers: dict[str, str] | None = None,
 ) -> dict[str, Any] | None:
     """Get the data from the URL. Expected to return JSON."""
-    headers = headers or {"content-type": "application/json"}
-    host, path = split_uri(url)
+    headers = headers or JSON_HEADERS
 
-    conn = http.client.HTTPSConnection(host)
-    conn.request("GET", path, headers=headers)
-    response = conn.getresponse()
-    if response.status not in range(200, 300):
-        logger.error("Error fetching message: %s", response.read())
+    status, body = _request("GET", url, headers=headers)
+    if not 200 <= status < 300:
+        logger.error("Error fetching message: %s %s", status, body[:MAX_LOGGED_BODY])
         return None
-    return json.loads(response.read())
+    return json.loads(body)
 
 
 def get_weather_string(url: str) -> str:
@@ -211,35 +535,44 @@ def get_weather_string(url: str) -> str:
     if not data:
         return ""
 
-    temp_min_c = f"min: {data['main']['temp_min'] - 273.15:.1f}°C"
-    temp_max_c = f"max: {data['main']['temp_max'] - 273.15:.1f}°C"
-    temp_feels_like_c = f"feels like: {data['main']['feels_like'] - 273.15:.1f}°C"
-    humidity = f"humidity: {data['main']['humidity']}%"
-    pressure = f"pressure: {data['main']['pressure']}hPa"
-
-    return f"{temp_min_c}, {temp_max_c}, {temp_feels_like_c}, {humidity}, {pressure}\n"
+    # Temperatures are in Kelvin; one f-string builds the line in a single pass
+    main = data["main"]
+    return (
+        f"min: {main['temp_min'] - 273.15:.1f}°C, "
+        f"max: {main['temp_max'] - 273.15:.1f}°C, "
+        f"feels like: {main['feels_like'] - 273.15:.1f}°C, "
+        f"humidity: {main['humidity']}%, "
+        f"pressure: {main['pressure']}hPa\n"
+    )
 
 
 def append_weather_to_content(config: Config, content: str) -> str:
     """Append weather line to content."""
-    if re.search(r"^min:.+Pa$", content, flags=re.MULTILINE):
+    if not config.openweathermap_url:
         return content
 
-    content += "\n" if content[-1] != "\n" else ""
+    # The weather line is always appended last, only the final line is checked
+    last_line = content.rstrip("\n").rpartition("\n")[2]
+    if last_line.startswith("min:") and last_line.endswith("Pa"):
+        return content
+
+    content += "\n" if not content.endswith("\n") else ""
     weather = get_weather_string(config.openweathermap_url)
     content += weather
     return content
 
 
-def post_brag_to_gist(config: Config, filename: str, content: str) -> None:
-    """Post the brag to a GitHub gist."""
-    # Remove http(s):// from the url
-    url = config.github_api_url.replace("http://", "").replace("https://", "")
-
+def post_brag_to_gist(
+    config: Config,
+    filename: str,
+    content: str,
+    date: str | None = None,
+) -> None:
+    """Post the brag to a GitHub gist. Today's date is used if date is None."""
     if not config.github_user or not config.github_pat or not config.gist_id:
         return None
 
-    conn = http.client.HTTPSConnection(url)
+    url = f"{config.github_api_url}/gists/{config.gist_id}"
     headers = {
         "accept": "application/vnd.github.v3+json",
         "user-agent": config.github_user,
@@ -247,35 +580,85 @@ def post_brag_to_gist(config: Config, filename: str, content: str) -> None:
     }
 
     data = {
-        "description": f"Brag posted: {datetime.now().strftime('%Y-%m-%d')}",
+        "description": f"Brag posted: {date or get_today()}",
         "files": {filename: {"content": content}},
     }
 
-    conn.request("PATCH", f"/gists/{config.gist_id}", json.dumps(data), headers)
-    response = conn.getresponse()
-    if response.status not in range(200, 300):
-        logger.error("Error sending gist: %s", response.read())
+    status, body = _request("PATCH", url, to_json_bytes(data), headers)
+    if not 200 <= status < 300:
+        logger.error("Error sending gist: %s %s", status, body[:MAX_LOGGED_BODY])
 
 
 def extract_title_from_message(message: str) -> str:
     """Extract the title from the message."""
-    match = re.search(r"^#{1,4}\s(.+)$", message, re.MULTILINE)
-    return match.group(1).strip() if match else ""
+    for line in message.split("\n"):
+        header = _header_text(line)
+        if header is not None:
+            return header.strip()
+    return ""
+
+
+def _bullet_to_diamond(line: str) -> str:
+    """Convert a single line's bullet mark to a diamond, if it has one."""
+    stripped = line.lstrip(" \t")
+    if stripped[:1] not in ("-", "*"):
+        return line
+
+    # Indented bullets are orange, top-level bullets are blue
+    if len(stripped) != len(line):
+        diamond = ":small_orange_diamond: "
+    else:
+        diamond = ":small_blue_diamond: "
+
+    text = stripped[1:]
+    return diamond + (text[1:] if text[:1].isspace() else text)
+
+
+def _header_text(line: str) -> str | None:
+    """Return the text of a level one to four header line, None if not a header."""
+    level = len(line) - len(line.lstrip("#"))
+    if not 1 <= level <= 4 or len(line) < level + 2 or not line[level].isspace():
+        return None
+    return line[level + 1 :]
 
 
 def bullet_marks_to_diamonds(message: str) -> str:
     """Convert bullet marks to diamonds."""
-    message = re.sub(r"^[-*]\s?", r":small_blue_diamond: ", message, flags=re.MULTILINE)
-    message = re.sub(
-        r"^(\s*)[-*]\s?", r":small_orange_diamond: ", message, flags=re.MULTILINE
-    )
-    return message
+    return "\n".join(_bullet_to_diamond(line) for line in message.split("\n"))
 
 
 def headers_to_bold(message: str) -> str:
     """Convert headers to bold."""
-    message = re.sub(r"^#{1,4}\s(.+)$", r"**\1**", message, flags=re.MULTILINE)
-    return message
+    return _format_lines(message, diamonds=False)[1]
+
+
+def _format_lines(message: str, diamonds: bool) -> tuple[str, str]:
+    """Extract the title and bold headers, optionally converting bullets too."""
+    title: str | None = None
+    lines = message.split("\n")
+    for idx, line in enumerate(lines):
+        header = _header_text(line)
+        if header is None:
+            if diamonds:
+                lines[idx] = _bullet_to_diamond(line)
+            continue
+
+        # The first header found is the title, no second search is needed
+        if title is None:
+            title = header.strip()
+        lines[idx] = f"**{header}**"
+
+    return title or "", "\n".join(lines)
+
+
+def extract_title_and_bold_headers(message: str) -> tuple[str, str]:
+    """Extract the title and convert headers to bold in a single pass."""
+    return _format_lines(message, diamonds=False)
+
+
+def format_discord_content(message: str) -> tuple[str, str]:
+    """Extract the title, bold headers, and convert bullets in a single pass."""
+    return _format_lines(message, diamonds=True)
 
 
 def build_discord_webhook_plain(
@@ -284,8 +667,10 @@ def build_discord_webhook_plain(
     content: str,
 ) -> dict[str, Any]:
     """Build the Discord webhook."""
-    content = f"{author} ({author_icon})\n{content}"
-    return {"username": "braghook", "content": f"```{content}```"}
+    return {
+        "username": "braghook",
+        "content": f"```{author} ({author_icon})\n{content}```",
+    }
 
 
 def build_discord_webhook(
@@ -294,9 +679,7 @@ def build_discord_webhook(
     content: str,
 ) -> dict[str, Any]:
     """Build the Discord webhook."""
-    title = extract_title_from_message(content)
-    content = bullet_marks_to_diamonds(content)
-    content = headers_to_bold(content)
+    title, content = format_discord_content(content)
 
     return {
         "username": "braghook",
@@ -320,8 +703,7 @@ def build_msteams_webhook(
     content: str,
 ) -> dict[str, Any]:
     """Build the MSTeams webhook."""
-    title = extract_title_from_message(content)
-    content = headers_to_bold(content)
+    title, content = extract_title_and_bold_headers(content)
     return {
         "type": "message",
         "attachments": [
@@ -367,13 +749,7 @@ def build_msteams_webhook(
                                             "weight": "bolder",
                                             "wrap": True,
                                         },
-                                        {
-                                            "type": "TextBlock",
-                                            "text": "sent by: braghook",
-                                            "spacing": "none",
-                                            "isSubtle": True,
-                                            "wrap": True,
-                                        },
+                                        MSTEAMS_SENT_BY_BLOCK,
                                     ],
                                 },
                             ],
@@ -390,17 +766,8 @@ def build_msteams_webhook(
                             "isVisible": False,
                         },
                     ],
-                    "actions": [
-                        {
-                            "type": "Action.ToggleVisibility",
-                            "title": "Toggle Content",
-                            "targetElements": ["contentToToggle"],
-                        },
-                    ],
-                    "msteams": {
-                        "width": "Full",
-                        "entities": [],
-                    },
+                    "actions": MSTEAMS_CARD_ACTIONS,
+                    "msteams": MSTEAMS_CARD_OPTIONS,
                 },
             }
         ],
@@ -409,6 +776,12 @@ def build_msteams_webhook(
 
 def parse_args(args: list[str] | None = None) -> argparse.Namespace:
     """Parse the arguments."""
+    return _get_parser().parse_args(args)
+
+
+@functools.lru_cache(maxsize=None)
+def _get_parser() -> argparse.ArgumentParser:
+    """Build the argument parser on first use, then reuse it."""
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "--send",
@@ -432,14 +805,47 @@ def parse_args(args: list[str] | None = None) -> argparse.Namespace:
         default=DEFAULT_CONFIG_FILE,
         help="The config file to use",
     )
-    return parser.parse_args(args)
+    return parser
 
 
-def send_brags(config: Config, filename: str, content: str) -> None:
+def send_brags(
+    config: Config,
+    filename: str,
+    content: str,
+    date: str | None = None,
+) -> None:
     """Send brags to hooks or other targets."""
-    send_message(config, content)
+    from concurrent.futures import ThreadPoolExecutor
+
+    try:
+        # Webhooks and the gist are independent, send them concurrently
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = {
+                "webhooks": executor.submit(send_message, config, content),
+                "gist": executor.submit(
+                    post_brag_to_gist, config, filename, content, date
+                ),
+            }
+
+        _raise_on_failure(futures)
 
-    post_brag_to_gist(config, filename, content)
+    finally:
+        close_connections()
+
+
+async def send_brags_async(
+    config: Config,
+    filename: str,
+    content: str,
+    date: str | None = None,
+) -> None:
+    """Send brags without blocking the running event loop."""
+    import asyncio
+
+    # send_brags already fans out over threads; run it off the event loop
+    loop = asyncio.get_running_loop()
+    send = functools.partial(send_brags, config, filename, content, date)
+    await loop.run_in_executor(None, send)
 
 
 def main(_args: list[str] | None = None) -> int:
@@ -450,14 +856,20 @@ def main(_args: list[str] | None = None) -> int:
         create_config()
         return 0
 
+    date = get_today()
     config = load_config(args.config)
-    filename = get_full_filename(config.workdir, args.bragfile)
+    filename = get_full_filename(config.workdir, args.bragfile, date)
 
     if args.send:
         content = read_file_contents(filename)
-        append_weather_to_content(config, content)
+        if is_empty_brag(content):
+            # A CLI notice like create_config's, logging is not configured here
+            print(f"Nothing to send, brag file is empty: {filename}")
+            return 0
+
+        content = append_weather_to_content(config, content)
 
-        send_brags(config, filename, content)
+        send_brags(config, filename, content, date)
 
         return 0
 
@@ -1,12 +1,20 @@
 from __future__ import annotations
 
+import http.client
+import io
 import json
 import os
-import tempfile
-from configparser import ConfigParser
+import subprocess
+import time
 from dataclasses import asdict
+from dataclasses import replace
 from datetime import datetime
 from pathlib import Path
+from types import MappingProxyType
+from typing import Any
+from typing import Generator
+from typing import Mapping
+from unittest.mock import MagicMock
 from unittest.mock import patch
 
 import pytest
@@ -14,161 +22,688 @@ import pytest
 from braghook import braghook
 
 MOCKFILE_CONTENTS = "# Bragging rights"
+AUTHOR = "Test Author"
+AUTHOR_ICON = "https://example.com/icon.png"
+BRAGFILE_ARGS = ("--bragfile", "tests/brag.md")
+HEADER_MESSAGES = (
+    "Test message",
+    "## Test message",
+    "## Test message \n Test message body",
+    "##\nTest message",
+    "##",
+    "#\tTitle ",
+    "##### Test message",
+    "- item\n### Sub\n# Later",
+)
+EXPECTED_POST_BODY = b'{"message":"Test message"}'
+EXPECTED_GIST_DATA = {
+    "description": "Brag posted: 2024-01-02",
+    "files": {"bragging-rights.md": {"content": "Test message"}},
+}
+
+
+class JsonEq:
+    """Compares equal to any JSON document that decodes to the given object."""
+
+    def __init__(self, obj: Any) -> None:
+        self.obj = obj
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, (str, bytes)) and json.loads(other) == self.obj
+
+
+# Non-default value for every Config field, so a silent fallback to Config() fails
+INI_VALUES = {
+    "workdir": "brags",
+    "editor": "nano",
+    "editor_args": "--wait",
+    "author": "Tester",
+    "author_icon": "https://example.com/icon.png",
+    "discord_webhook": "https://discord.com/api/webhooks/1/abc",
+    "discord_webhook_plain": "https://discord.com/api/webhooks/2/def",
+    "msteams_webhook": "https://example.webhook.office.com/webhookb2/ghi",
+    "github_api_url": "https://github.example.com/api",
+    "github_user": "test_user",
+    "github_pat": "test_pat",
+    "gist_id": "abc123",
+    "openweathermap_url": "https://api.openweathermap.org/data/2.5/weather?q=x",
+}
+
+MAIN_COLLABORATORS = (
+    "create_config",
+    "load_config",
+    "get_full_filename",
+    "open_editor",
+    "read_file_contents",
+    "append_weather_to_content",
+    "send_brags",
+)
+
+
+@pytest.fixture(scope="session")
+def default_config() -> braghook.Config:
+    """A default Config, shared as the dataclass is frozen."""
+    return braghook.Config()
+
+
+@pytest.fixture(scope="session")
+def default_asdict(default_config: braghook.Config) -> Mapping[str, Any]:
+    """The default Config as a read-only mapping, as written by create_config."""
+    return MappingProxyType(asdict(default_config))
+
+
+@pytest.fixture(scope="session")
+def editor_config(default_config: braghook.Config) -> braghook.Config:
+    """The default Config with an extra editor argument."""
+    return replace(default_config, editor_args="--test_flag")
+
+
+@pytest.fixture(scope="session")
+def braghook_ini(tmp_path_factory: pytest.TempPathFactory) -> str:
+    """Path to a config file shared by the whole session. Do not modify."""
+    file = tmp_path_factory.mktemp("config") / "braghook.ini"
+    lines = [f"{key} = {value}" for key, value in INI_VALUES.items()]
+    file.write_text("\n".join(["[DEFAULT]", *lines]) + "\n")
+    return str(file)
+
+
+@pytest.fixture(scope="session")
+def loaded_config(braghook_ini: str) -> braghook.Config:
+    """The Config loaded from braghook_ini, parsed once per session."""
+    return braghook.load_config(braghook_ini)
+
+
+@pytest.fixture
+def main_mocks(monkeypatch: pytest.MonkeyPatch) -> dict[str, MagicMock]:
+    """Replace every function main() dispatches to with a MagicMock."""
+    mocks = {name: MagicMock() for name in MAIN_COLLABORATORS}
+    for name, mock in mocks.items():
+        monkeypatch.setattr(braghook, name, mock)
+    return mocks
+
+
+@pytest.fixture
+def mock_connection() -> Generator[MagicMock, None, None]:
+    """Patch connection lookup. The connection is the mock's return_value."""
+    with patch.object(braghook, "_get_connection") as mock_get_connection:
+        yield mock_get_connection
+
+
+@pytest.fixture(autouse=True)
+def clear_connections() -> Generator[None, None, None]:
+    """Ensure no cached connection leaks between tests."""
+    yield
+    braghook.close_connections()
+
+
+@pytest.fixture(autouse=True)
+def clear_config_cache() -> Generator[None, None, None]:
+    """Ensure no cached config leaks between tests."""
+    yield
+    braghook.clear_config_cache()
+
 
+def test_get_today() -> None:
+    with patch.object(braghook, "datetime") as mock_datetime:
+        mock_datetime.now.return_value = datetime(2024, 1, 2, 23, 59)
 
-def test_load_config() -> None:
-    config = braghook.load_config("tests/braghook.ini")
+        assert braghook.get_today() == "2024-01-02"
 
-    assert config.workdir == "."
+
+@pytest.mark.parametrize("field, expected", INI_VALUES.items())
+def test_load_config(loaded_config: braghook.Config, field: str, expected: str) -> None:
+    assert getattr(loaded_config, field) == expected
+
+
+def test_ini_values_differ_from_every_default(
+    default_asdict: Mapping[str, Any],
+) -> None:
+    assert INI_VALUES.keys() == default_asdict.keys()
+    assert all(INI_VALUES[key] != value for key, value in default_asdict.items())
+
+
+def test_load_config_missing_file(
+    tmp_path: Path,
+    default_config: braghook.Config,
+) -> None:
+    config = braghook.load_config(str(tmp_path / "missing.ini"))
+
+    assert config == default_config
+
+
+def test_load_config_partial_file_keeps_defaults(tmp_path: Path) -> None:
+    file = tmp_path / "braghook.ini"
+    file.write_text("[DEFAULT]\ngithub_api_url = https://github.example.com/api\n")
+
+    config = braghook.load_config(str(file))
+
+    assert config.github_api_url == "https://github.example.com/api"
     assert config.editor == "vim"
-    assert config.editor_args == ""
-    assert config.author == "braghook"
-    assert config.author_icon == ""
-    assert config.discord_webhook == ""
-    assert config.discord_webhook_plain == ""
-    assert config.msteams_webhook == ""
-    assert config.github_api_url == "https://api.github.com"
-    assert config.github_user == ""
-    assert config.github_pat == ""
-    assert config.gist_id == ""
-    assert config.openweathermap_url == ""
 
 
-def test_create_config_with_tempfile() -> None:
-    expected_config = ConfigParser()
-    expected_config.read_dict({"DEFAULT": asdict(braghook.Config())})
+def test_parse_ini_defaults() -> None:
+    text = "\n".join(
+        [
+            "ignored = before any section",
+            "[DEFAULT]",
+            "# comment",
+            "; another comment",
+            "",
+            "Author = Some One",
+            "discord_webhook = https://discord.com/api/webhooks/1?a=b%20c",
+            "editor: code",
+            "no delimiter here",
+            "[other]",
+            "author = not default",
+        ]
+    )
+    expected = {
+        "author": "Some One",
+        "discord_webhook": "https://discord.com/api/webhooks/1?a=b%20c",
+        "editor": "code",
+    }
+
+    assert braghook.parse_ini_defaults(text) == expected
 
-    with tempfile.NamedTemporaryFile(mode="w", delete=False) as file:
-        ...
-    os.remove(file.name)
 
-    braghook.create_config(file.name)
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("[DEFAULT]\nauthor = 100%% done\n", {"author": "100% done"}),
+        (
+            "[DEFAULT]\neditor_args = --one\n  --two\n\n  --three\nauthor = x\n",
+            {"editor_args": "--one\n--two\n\n--three", "author": "x"},
+        ),
+    ],
+    ids=["escaped-percent", "continuation-line"],
+)
+def test_parse_ini_defaults_compatible(text: str, expected: dict[str, str]) -> None:
+    assert braghook.parse_ini_defaults(text) == expected
 
-    try:
-        actual_config = ConfigParser()
-        actual_config.read(file.name)
 
-        assert actual_config == expected_config
+def test_parse_ini_defaults_warns_without_default_section(
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    assert braghook.parse_ini_defaults("[other]\nauthor = Some One\n") == {}
+    assert "No [DEFAULT] section" in caplog.text
 
-    finally:
-        os.remove(file.name)
 
+def test_load_config_skips_byte_order_mark(tmp_path: Path) -> None:
+    file = tmp_path / "braghook.ini"
+    file.write_text("[DEFAULT]\nauthor = Some One\n", encoding="utf-8-sig")
 
-def test_create_config_does_not_overwrite() -> None:
-    with tempfile.NamedTemporaryFile(mode="w", delete=False) as file:
-        file.write("[braghook]\n")
+    assert braghook.load_config(str(file)).author == "Some One"
 
-    try:
-        with patch("braghook.braghook.ConfigParser.write") as mock_write:
-            braghook.create_config(file.name)
 
-        mock_write.assert_not_called()
+def test_load_config_cached_until_file_changes(tmp_path: Path) -> None:
+    file = tmp_path / "braghook.ini"
+    file.write_text("[DEFAULT]\nauthor = first\n")
 
-    finally:
-        os.remove(file.name)
+    first = braghook.load_config(str(file))
+    second = braghook.load_config(str(file))
 
+    file.write_text("[DEFAULT]\nauthor = second\n")
+    os.utime(file, ns=(0, 0))
+    third = braghook.load_config(str(file))
 
-def test_get_full_filename_exists_does_not_overrwite() -> None:
-    """Assert existing file is not overwritten."""
-    with tempfile.NamedTemporaryFile(mode="w", delete=False) as file:
-        file.write("Test")
-        filepath = Path(file.name)
+    assert first is second
+    assert first.author == "first"
+    assert third.author == "second"
 
-    try:
-        with patch("braghook.braghook.create_empty_template_file") as mock_create_file:
-            braghook.get_full_filename(str(filepath.parent), filepath.name)
+    braghook.clear_config_cache()
 
-        mock_create_file.assert_not_called()
+    assert braghook.load_config(str(file)) is not third
 
-    finally:
-        os.remove(file.name)
 
+def test_create_config_with_tempfile(
+    tmp_path: Path,
+    default_asdict: Mapping[str, Any],
+) -> None:
+    pairs = default_asdict.items()
+    expected = "[DEFAULT]\n" + "".join(f"{k} = {v}\n" for k, v in pairs)
+    file = tmp_path / "braghook.ini"
 
-def test_get_full_filename_create_file() -> None:
+    braghook.create_config(str(file))
+
+    assert file.read_text().strip() == expected.strip()
+
+
+def test_config_defaults(default_asdict: Mapping[str, Any]) -> None:
+    assert braghook.CONFIG_DEFAULTS == default_asdict
+
+
+def test_write_config(default_asdict: Mapping[str, Any]) -> None:
+    buffer = io.StringIO()
+
+    braghook._write_config(buffer)
+
+    assert braghook.parse_ini_defaults(buffer.getvalue()) == default_asdict
+
+
+def test_create_config_does_not_overwrite(tmp_path: Path) -> None:
+    file = tmp_path / "braghook.ini"
+    file.write_text("[braghook]\n")
+
+    with patch.object(braghook, "_write_config") as mock_write:
+        braghook.create_config(str(file))
+
+    mock_write.assert_not_called()
+    assert file.read_text() == "[braghook]\n"
+
+
+def test_get_full_filename_exists_does_not_overrwite(tmp_path: Path) -> None:
+    """Assert existing file is not overwritten."""
+    filepath = tmp_path / "brag.md"
+    filepath.write_text("Test")
+
+    braghook.get_full_filename(str(tmp_path), filepath.name, "2023-01-01")
+
+    assert filepath.read_text() == "Test"
+
+
+def test_get_full_filename_create_file(
+    default_config: braghook.Config,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
     """Assert we create a file matching the NEWFILE_NAME"""
-    config = braghook.Config()
-    # Fun fact, this can fail if you run it at midnight
-    filename = Path(config.workdir) / braghook.NEWFILE_NAME
+    filename = "brag-2023-01-01.md"  # No "./" prefix from the default workdir
+
+    mock_create_file = MagicMock()
+    monkeypatch.setattr(braghook, "create_empty_template_file", mock_create_file)
+
+    result = braghook.get_full_filename(default_config.workdir, None, "2023-01-01")
+
+    assert result == filename
+    mock_create_file.assert_called_once_with(filename, "2023-01-01")
+
+
+def test_get_full_filename_defaults_to_today(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(braghook, "get_today", lambda: "2024-01-02")
+
+    result = braghook.get_full_filename(str(tmp_path), None)
+
+    assert result == str(tmp_path / "brag-2024-01-02.md")
+
+
+def test_open_editor_file_exists(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    editor_config: braghook.Config,
+) -> None:
+    filename = str(tmp_path / "test-brag.md")
+    mock_spawn = MagicMock(return_value=1234)
+    mock_wait = MagicMock()
+    monkeypatch.setattr(os, "posix_spawnp", mock_spawn)
+    monkeypatch.setattr(os, "waitpid", mock_wait)
+
+    braghook.open_editor(editor_config, filename)
+
+    mock_spawn.assert_called_once_with(
+        "vim", ["vim", "--test_flag", filename], os.environ
+    )
+    mock_wait.assert_called_once_with(1234, 0)
+
+
+def test_config_editor_argv_cached() -> None:
+    config = braghook.Config(editor_args="-n  --test_flag")
+
+    assert config.editor_argv == ("-n", "--test_flag")
+    assert config.editor_argv is config.editor_argv
+    assert "editor_argv" not in asdict(config)
+
+
+def test_open_editor_without_posix_spawnp(
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: Path,
+    editor_config: braghook.Config,
+) -> None:
+    filename = str(tmp_path / "test-brag.md")
+    monkeypatch.delattr(os, "posix_spawnp")
+
+    mock_run = MagicMock()
+    monkeypatch.setattr(subprocess, "run", mock_run)
+
+    braghook.open_editor(editor_config, filename)
+
+    mock_run.assert_called_once_with(["vim", "--test_flag", filename])
+
+
+def test_read_file_contents(tmp_path: Path) -> None:
+    file = tmp_path / "brag.md"
+    file.write_text(MOCKFILE_CONTENTS)
 
-    with patch("braghook.braghook.create_empty_template_file") as mock_create_file:
-        result = braghook.get_full_filename(config.workdir, None)
+    assert braghook.read_file_contents(str(file)) == MOCKFILE_CONTENTS
 
-    assert result == str(filename)
-    assert mock_create_file.call_count == 1
 
+def test_read_file_contents_normalizes_line_endings(tmp_path: Path) -> None:
+    file = tmp_path / "brag.md"
+    file.write_bytes("## Title\r\n- 27.0°C\r- 28.0°C\r\n".encode("utf-8"))
 
-def test_open_editor_file_exists() -> None:
-    config = braghook.Config(editor_args="--test_flag")
-    filename = "tests/test-brag.md"
-    with patch("subprocess.run") as mock_run:
-        braghook.open_editor(config, filename)
+    assert braghook.read_file_contents(str(file)) == "## Title\n- 27.0°C\n- 28.0°C\n"
 
-        mock_run.assert_called_once_with(["vim", "--test_flag", filename])
 
+def test_read_file_contents_replaces_undecodable_bytes(tmp_path: Path) -> None:
+    file = tmp_path / "brag.md"
+    file.write_bytes("- 27.0°C\n".encode("cp1252"))
 
-def test_read_file_contents() -> None:
-    try:
-        with tempfile.NamedTemporaryFile(mode="w", delete=False) as file:
-            file.write(MOCKFILE_CONTENTS)
+    assert braghook.read_file_contents(str(file)) == "- 27.0\ufffdC\n"
 
-        assert braghook.read_file_contents(file.name) == MOCKFILE_CONTENTS
 
-    finally:
-        os.remove(file.name)
+def test_create_empty_template_file(tmp_path: Path) -> None:
+    file = tmp_path / "test-brag.md"
 
+    braghook.create_empty_template_file(str(file), "2023-01-01")
 
-def test_create_empty_template_file() -> None:
-    filename = "tests/test-brag.md"
+    assert file.read_text().startswith("### 2023-01-01\n")
 
-    try:
-        braghook.create_empty_template_file(filename)
 
-        assert Path(filename).is_file()
+def test_create_empty_template_file_defaults_to_today(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    file = tmp_path / "test-brag.md"
+    monkeypatch.setattr(braghook, "get_today", lambda: "2024-01-02")
 
-    finally:
-        os.remove(filename)
+    braghook.create_empty_template_file(str(file))
+
+    assert file.read_text().startswith("### 2024-01-02\n")
+
+
+def test_create_empty_template_file_does_not_overwrite(tmp_path: Path) -> None:
+    file = tmp_path / "brag.md"
+    file.write_text(MOCKFILE_CONTENTS)
+
+    braghook.create_empty_template_file(str(file), "2023-01-01")
+
+    assert file.read_text() == MOCKFILE_CONTENTS
 
 
 def test_split_uri() -> None:
     uri = "https://discord.com/api/webhooks/1234567890/abcdefghijklmnopqrstuvwxyz"
     uri_no_path = "https://discord.com"
-    expected = ("discord.com", "/api/webhooks/1234567890/abcdefghijklmnopqrstuvwxyz")
-    expected_no_path = ("discord.com", "")
+    uri_query = "http://example.com/data?q=here&appid=abc"
+    expected = (
+        "https",
+        "discord.com",
+        "/api/webhooks/1234567890/abcdefghijklmnopqrstuvwxyz",
+    )
+    expected_no_path = ("https", "discord.com", "/")
+    expected_query = ("http", "example.com", "/data?q=here&appid=abc")
 
     assert braghook.split_uri(uri) == expected
     assert braghook.split_uri(uri_no_path) == expected_no_path
+    assert braghook.split_uri(uri_query) == expected_query
+
+
+def test_split_uri_defaults_to_https() -> None:
+    uri = "discord.com/api/webhooks/1"
+
+    assert braghook.split_uri(uri) == ("https", "discord.com", "/api/webhooks/1")
+    assert braghook.split_uri("example.com/cb?next=https://x") == (
+        "https",
+        "example.com",
+        "/cb?next=https://x",
+    )
 
 
-def test__post() -> None:
+def test__get_plain_http() -> None:
+    url = "http://example.com/data?q=here"
+
+    with patch.object(http.client, "HTTPConnection") as mock_connection:
+        mock_connection.return_value.getresponse.return_value.status = 200
+        mock_connection.return_value.getresponse.return_value.read.return_value = b"{}"
+        result = braghook._get(url)
+
+        assert result == {}
+        mock_connection.assert_called_once_with(
+            "example.com", timeout=braghook.REQUEST_TIMEOUT
+        )
+        mock_connection.return_value.request.assert_called_once_with(
+            "GET", "/data?q=here", None, {"content-type": "application/json"}
+        )
+
+
+def test__post(mock_connection: MagicMock) -> None:
     url = "https://discord.com/api/webhooks/1234567890/abcdefghijklmnopqrstuvwxyz"
     message = {"message": "Test message"}
     expected_domain = "discord.com"
     expected_route = "/api/webhooks/1234567890/abcdefghijklmnopqrstuvwxyz"
     expected_headers = {"content-type": "application/json"}
 
-    with patch("http.client.HTTPSConnection") as mock_connection:
+    mock_connection.return_value.getresponse.return_value.status = 204
+    braghook._post(url, message)
+
+    mock_connection.assert_called_once_with("https", expected_domain)
+    mock_connection.return_value.request.assert_called_once_with(
+        "POST", expected_route, EXPECTED_POST_BODY, expected_headers
+    )
+
+
+def test__post_reuses_connection() -> None:
+    url = "https://discord.com/api/webhooks/1234567890/abcdefghijklmnopqrstuvwxyz"
+
+    with patch.object(http.client, "HTTPSConnection") as mock_connection:
         mock_connection.return_value.getresponse.return_value.status = 204
-        braghook._post(url, message)
+        braghook._post(url, {"message": "first"})
+        braghook._post(url, {"message": "second"})
 
-        mock_connection.assert_called_once_with(expected_domain)
-        mock_connection.return_value.request.assert_called_once_with(
-            "POST", expected_route, json.dumps(message), expected_headers
+        mock_connection.assert_called_once_with(
+            "discord.com", timeout=braghook.REQUEST_TIMEOUT
         )
+        assert mock_connection.return_value.request.call_count == 2
+
+
+def test__request_opens_second_connection_when_busy() -> None:
+    url = "https://discord.com/api/webhooks/1234567890/abcdefghijklmnopqrstuvwxyz"
+
+    patcher = patch.object(http.client, "HTTPSConnection")
+
+    def _nested_request(*args: Any, **kwargs: Any) -> None:
+        # Simulate a concurrent request to the same host while this one is busy
+        if https_connection.call_count == 1:
+            braghook._request("POST", url, b"{}")
+
+    with patcher as https_connection:
+        https_connection.return_value.getresponse.return_value.status = 204
+        https_connection.return_value.request.side_effect = _nested_request
+
+        braghook._request("POST", url, b"{}")
+
+        assert https_connection.call_count == 2
+
+
+def test__request_closes_connection_on_error() -> None:
+    url = "https://discord.com/api/webhooks/1234567890/abcdefghijklmnopqrstuvwxyz"
+
+    with patch.object(http.client, "HTTPSConnection") as mock_connection:
+        mock_connection.return_value.request.side_effect = OSError("boom")
+
+        with pytest.raises(OSError, match="boom"):
+            braghook._request("POST", url, b"{}")
+
+        mock_connection.return_value.close.assert_called_once()
+        assert not braghook._idle_connections
+
+
+def test__request_retries_stale_connection_once() -> None:
+    url = "https://discord.com/api/webhooks/1234567890/abcdefghijklmnopqrstuvwxyz"
+    stale = MagicMock()
+    stale.request.side_effect = BrokenPipeError()
+    braghook._idle_connections["https://discord.com"] = [stale]
+
+    with patch.object(http.client, "HTTPSConnection") as mock_connection:
+        mock_connection.return_value.getresponse.return_value.status = 204
+
+        result = braghook._request("POST", url, b"{}")
+
+        stale.close.assert_called_once()
+        mock_connection.assert_called_once()
+        assert result[0] == 204
+        assert braghook._idle_connections["https://discord.com"] == [
+            mock_connection.return_value
+        ]
+
+
+@pytest.mark.parametrize("method, retried", [("PATCH", True), ("POST", False)])
+def test__request_resends_after_disconnect_only_if_idempotent(
+    method: str,
+    retried: bool,
+) -> None:
+    url = "https://api.github.com/gists/abc"
+    stale = MagicMock()
+    stale.getresponse.side_effect = http.client.RemoteDisconnected("closed")
+    braghook._idle_connections["https://api.github.com"] = [stale]
+
+    with patch.object(http.client, "HTTPSConnection") as mock_connection:
+        mock_connection.return_value.getresponse.return_value.status = 200
+
+        if retried:
+            assert braghook._request(method, url, b"{}")[0] == 200
+        else:
+            with pytest.raises(http.client.RemoteDisconnected):
+                braghook._request(method, url, b"{}")
+
+        stale.close.assert_called_once()
+        assert mock_connection.called is retried
+
+
+def test__request_closes_retried_connection_on_error() -> None:
+    url = "https://discord.com/api/webhooks/1234567890/abcdefghijklmnopqrstuvwxyz"
+    stale = MagicMock()
+    stale.request.side_effect = BrokenPipeError()
+    braghook._idle_connections["https://discord.com"] = [stale]
+
+    with patch.object(http.client, "HTTPSConnection") as mock_connection:
+        mock_connection.return_value.request.side_effect = OSError("boom")
+
+        with pytest.raises(OSError, match="boom"):
+            braghook._request("POST", url, b"{}")
+
+        mock_connection.return_value.close.assert_called_once()
+        assert not braghook._idle_connections["https://discord.com"]
+
+
+def test__request_does_not_retry_new_connection_on_disconnect() -> None:
+    url = "https://discord.com/api/webhooks/1234567890/abcdefghijklmnopqrstuvwxyz"
+
+    with patch.object(http.client, "HTTPSConnection") as mock_connection:
+        mock_connection.return_value.sock = None
+        mock_connection.return_value.request.side_effect = BrokenPipeError()
+
+        with pytest.raises(BrokenPipeError):
+            braghook._request("POST", url, b"{}")
+
+        mock_connection.assert_called_once()
+
+
+def test__request_retries_transient_errors() -> None:
+    url = "https://discord.com/api/webhooks/1234567890/abcdefghijklmnopqrstuvwxyz"
+    responses = [(429, b"", "1.5"), (503, b"", None), (204, b"", None)]
+
+    with patch.object(braghook, "_send_once", side_effect=responses) as mock_send:
+        with patch.object(time, "sleep") as mock_sleep:
+            result = braghook._request("POST", url, b"{}")
+
+    assert result == (204, b"")
+    assert mock_send.call_count == 3
+    assert [call.args[0] for call in mock_sleep.call_args_list] == [
+        1.5,
+        braghook.RETRY_BACKOFF * 2,
+    ]
+
+
+def test__request_gives_up_after_max_retries() -> None:
+    url = "https://discord.com/api/webhooks/1234567890/abcdefghijklmnopqrstuvwxyz"
+
+    with patch.object(braghook, "_send_once", return_value=(500, b"down", None)):
+        with patch.object(time, "sleep") as mock_sleep:
+            result = braghook._request("PATCH", url, b"{}")
+
+    assert result == (500, b"down")
+    assert mock_sleep.call_count == braghook.MAX_RETRIES
+
+
+def test__request_does_not_retry_post_on_server_error() -> None:
+    url = "https://discord.com/api/webhooks/1234567890/abcdefghijklmnopqrstuvwxyz"
+
+    with patch.object(braghook, "_send_once", return_value=(500, b"down", None)):
+        with patch.object(time, "sleep") as mock_sleep:
+            result = braghook._request("POST", url, b"{}")
 
+    assert result == (500, b"down")
+    mock_sleep.assert_not_called()
 
-def test__post_failed(caplog: pytest.LogCaptureFixture) -> None:
+
+@pytest.mark.parametrize(
+    "retry_after, attempt, expected",
+    [
+        (None, 0, 0.25),
+        (None, 2, 1.0),
+        ("2", 0, 2.0),
+        ("Wed, 21 Oct 2015 07:28:00 GMT", 1, 0.5),
+        ("3600", 0, braghook.REQUEST_TIMEOUT),
+        ("-1", 0, 0.0),
+        ("nan", 1, 0.5),
+    ],
+)
+def test__retry_delay(retry_after: str | None, attempt: int, expected: float) -> None:
+    assert braghook._retry_delay(retry_after, attempt) == expected
+
+
+def test_close_connections() -> None:
+    with patch.object(http.client, "HTTPSConnection") as mock_connection:
+        mock_connection.return_value.getresponse.return_value.status = 204
+        braghook._post("https://discord.com/api", {"message": "Test message"})
+
+        braghook.close_connections()
+        braghook._post("https://discord.com/api", {"message": "Test message"})
+
+        mock_connection.return_value.close.assert_called_once()
+        assert mock_connection.call_count == 2
+
+
+def test__post_failed(
+    caplog: pytest.LogCaptureFixture,
+    mock_connection: MagicMock,
+) -> None:
     url = "https://discord.com/api/webhooks/1234567890/abcdefghijklmnopqrstuvwxyz"
     message = {"message": "Test message"}
 
-    with patch("http.client.HTTPSConnection") as mock_connection:
-        mock_connection.return_value.getresponse.return_value.status = 400
+    mock_connection.return_value.getresponse.return_value.status = 400
+
+    braghook._post(url, message)
+
+    assert "Error sending message:" in caplog.text
+
+
+def test_to_json_bytes() -> None:
+    data = {"content": "min: 27.0°C", "embeds": [{"color": 1}]}
+    expected = '{"content":"min: 27.0°C","embeds":[{"color":1}]}'.encode("utf-8")
+
+    assert braghook.to_json_bytes(data) == expected
+
+
+def test__post_failed_truncates_logged_body(
+    caplog: pytest.LogCaptureFixture,
+    mock_connection: MagicMock,
+) -> None:
+    url = "https://discord.com/api/webhooks/1234567890/abcdefghijklmnopqrstuvwxyz"
+
+    response = mock_connection.return_value.getresponse.return_value
+    response.status = 400
+    response.read.return_value = b"x" * (braghook.MAX_LOGGED_BODY + 1)
 
-        braghook._post(url, message)
+    braghook._post(url, {"message": "Test message"})
 
-        assert "Error sending message:" in caplog.text
+    assert "400" in caplog.text
+    assert "x" * braghook.MAX_LOGGED_BODY in caplog.text
+    assert "x" * (braghook.MAX_LOGGED_BODY + 1) not in caplog.text
 
 
-def test__get() -> None:
+def test__get(mock_connection: MagicMock) -> None:
     url = "https://api.github.com/gists/1234567890"
     response_bytes = json.dumps({"test": "response"}).encode("utf-8")
     expected_domain = "api.github.com"
@@ -176,46 +711,136 @@ def test__get() -> None:
     expected_headers = {"content-type": "application/json"}
     expected_response = {"test": "response"}
 
-    with patch("http.client.HTTPSConnection") as mock_connection:
-        mock_connection.return_value.getresponse.return_value.read.return_value = (
-            response_bytes
-        )
-        mock_connection.return_value.getresponse.return_value.status = 200
-        result = braghook._get(url)
+    mock_connection.return_value.getresponse.return_value.read.return_value = (
+        response_bytes
+    )
+    mock_connection.return_value.getresponse.return_value.status = 200
+    result = braghook._get(url)
 
-        assert result == expected_response
-        mock_connection.assert_called_once_with(expected_domain)
-        mock_connection.return_value.request.assert_called_once_with(
-            "GET", expected_route, headers=expected_headers
-        )
+    assert result == expected_response
+    mock_connection.assert_called_once_with("https", expected_domain)
+    mock_connection.return_value.request.assert_called_once_with(
+        "GET", expected_route, None, expected_headers
+    )
 
 
-def test__get_failed(caplog: pytest.LogCaptureFixture) -> None:
+def test__get_failed(
+    caplog: pytest.LogCaptureFixture,
+    mock_connection: MagicMock,
+) -> None:
     url = "https://api.github.com/gists/1234567890"
 
-    with patch("http.client.HTTPSConnection") as mock_connection:
-        mock_connection.return_value.getresponse.return_value.status = 400
+    mock_connection.return_value.getresponse.return_value.status = 400
 
-        result = braghook._get(url)
+    result = braghook._get(url)
 
-        assert result is None
-        assert "Error fetching message:" in caplog.text
+    assert result is None
+    assert "Error fetching message:" in caplog.text
 
 
-def test_send_message() -> None:
+def test_send_message(monkeypatch: pytest.MonkeyPatch) -> None:
     config = braghook.Config(
         discord_webhook="https://discord.com/api/webhooks/1234567890/abc",
     )
     message = "Test message"
 
-    with patch("braghook.braghook._post") as mock_post_message:
-        braghook.send_message(config, message)
+    mock_post_message = MagicMock()
+    monkeypatch.setattr(braghook, "_post", mock_post_message)
+
+    braghook.send_message(config, message)
+
+    mock_post_message.assert_called_once()
 
-        mock_post_message.assert_called_once()
 
+def test_send_message_empty_content() -> None:
+    config = braghook.Config(discord_webhook="https://discord.com/api/webhooks/1")
+
+    with patch.object(braghook, "build_discord_webhook") as mock_builder:
+        with patch.object(braghook, "_post") as mock_post_message:
+            braghook.send_message(config, " \n\t")
+
+    mock_builder.assert_not_called()
+    mock_post_message.assert_not_called()
+
+
+def test_send_message_no_webhooks(
+    default_config: braghook.Config,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    mock_post_message = MagicMock()
+    monkeypatch.setattr(braghook, "_post", mock_post_message)
+
+    braghook.send_message(default_config, "Test message")
+
+    mock_post_message.assert_not_called()
+
+
+def test_send_message_posts_each_webhook(monkeypatch: pytest.MonkeyPatch) -> None:
+    config = braghook.Config(
+        discord_webhook="https://discord.com/api/webhooks/1234567890/abc",
+        discord_webhook_plain="https://discord.com/api/webhooks/1234567890/def",
+        msteams_webhook="https://example.webhook.office.com/webhookb2/ghi",
+    )
+
+    mock_post_message = MagicMock()
+    monkeypatch.setattr(braghook, "_post", mock_post_message)
+
+    braghook.send_message(config, "Test message")
+
+    assert mock_post_message.call_count == 3
+
+
+def test_send_message_raises_worker_error() -> None:
+    config = braghook.Config(discord_webhook="https://discord.com/api/webhooks/1")
+
+    with patch.object(braghook, "_post", side_effect=OSError("boom")):
+        with pytest.raises(OSError, match="boom"):
+            braghook.send_message(config, "Test message")
+
+
+def test_send_message_posts_others_when_one_fails() -> None:
+    config = braghook.Config(
+        discord_webhook="https://discord.com/api/webhooks/1234567890/abc",
+        msteams_webhook="https://example.webhook.office.com/webhookb2/ghi",
+    )
+
+    def _post(url: str, data: dict[str, Any]) -> None:
+        if url == config.discord_webhook:
+            raise OSError("boom")
+
+    with patch.object(braghook, "_post", side_effect=_post) as mock_post_message:
+        with pytest.raises(OSError, match="boom"):
+            braghook.send_message(config, "Test message")
+
+    assert mock_post_message.call_count == 2
+
+
+def test_send_message_logs_every_failure(caplog: pytest.LogCaptureFixture) -> None:
+    config = braghook.Config(
+        discord_webhook="https://discord.com/api/webhooks/1234567890/abc",
+        discord_webhook_plain="https://discord.com/api/webhooks/1234567890/def",
+        msteams_webhook="https://example.webhook.office.com/webhookb2/ghi",
+    )
+
+    def _post(url: str, data: dict[str, Any]) -> None:
+        if url != config.discord_webhook_plain:
+            raise OSError(f"boom {url}")
+
+    with patch.object(braghook, "_post", side_effect=_post):
+        with pytest.raises(OSError, match="webhooks/1234567890/abc"):
+            braghook.send_message(config, "Test message")
+
+    assert config.discord_webhook in caplog.text
+    assert config.msteams_webhook in caplog.text
+    assert config.discord_webhook_plain not in caplog.text
+
+
+def test_post_brag_to_gist(
+    mock_connection: MagicMock,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(braghook, "get_today", lambda: "2024-01-02")
 
-def test_post_brag_to_gist() -> None:
-    date = datetime.now().strftime("%Y-%m-%d")
     config = braghook.Config(
         github_user="test_user",
         github_pat="test_pat",
@@ -223,57 +848,67 @@ def test_post_brag_to_gist() -> None:
     )
     message = "Test message"
 
-    with patch("http.client.HTTPSConnection") as mock_connection:
-        mock_connection.return_value.getresponse.return_value.status = 200
-        braghook.post_brag_to_gist(config, "bragging-rights.md", message)
+    mock_connection.return_value.getresponse.return_value.status = 200
+    braghook.post_brag_to_gist(config, "bragging-rights.md", message)
+
+    mock_connection.assert_called_once_with("https", "api.github.com")
+    mock_connection.return_value.request.assert_called_once_with(
+        "PATCH",
+        "/gists/test_gist_id",
+        JsonEq(EXPECTED_GIST_DATA),
+        {
+            "accept": "application/vnd.github.v3+json",
+            "user-agent": "test_user",
+            "authorization": "token test_pat",
+        },
+    )
 
-        mock_connection.assert_called_once_with("api.github.com")
-        mock_connection.return_value.request.assert_called_once_with(
-            "PATCH",
-            "/gists/test_gist_id",
-            json.dumps(
-                {
-                    "description": f"Brag posted: {date}",
-                    "files": {"bragging-rights.md": {"content": message}},
-                }
-            ),
-            {
-                "accept": "application/vnd.github.v3+json",
-                "user-agent": "test_user",
-                "authorization": "token test_pat",
-            },
-        )
 
+def test_post_brag_to_gist_with_date() -> None:
+    config = braghook.Config(
+        github_user="test_user",
+        github_pat="test_pat",
+        gist_id="test_gist_id",
+    )
+
+    with patch.object(braghook, "_request") as mock_request:
+        mock_request.return_value = (200, b"")
+        braghook.post_brag_to_gist(config, "brag.md", "message", "2023-01-01")
+
+        body = json.loads(mock_request.call_args[0][2])
+        assert body["description"] == "Brag posted: 2023-01-01"
 
-def test_post_brag_to_gist_failure(caplog: pytest.LogCaptureFixture) -> None:
+
+def test_post_brag_to_gist_failure(
+    caplog: pytest.LogCaptureFixture,
+    mock_connection: MagicMock,
+) -> None:
     config = braghook.Config(
         github_user="test_user",
         github_pat="test_pat",
         gist_id="test_gist_id",
     )
 
-    with patch("http.client.HTTPSConnection") as mock_connection:
-        mock_connection.return_value.getresponse.return_value.status = 403
-        braghook.post_brag_to_gist(config, "bragging-rights.md", "message")
+    mock_connection.return_value.getresponse.return_value.status = 403
+    braghook.post_brag_to_gist(config, "bragging-rights.md", "message")
 
-        mock_connection.assert_called_once_with("api.github.com")
-        assert "Error sending gist:" in caplog.text
+    mock_connection.assert_called_once_with("https", "api.github.com")
+    assert "Error sending gist:" in caplog.text
 
 
-def test_post_brag_tol_gist_no_pat() -> None:
+def test_post_brag_tol_gist_no_pat(mock_connection: MagicMock) -> None:
     config = braghook.Config(
         github_user="test_user",
         github_pat="",
         gist_id="test_gist_id",
     )
 
-    with patch("http.client.HTTPSConnection") as mock_connection:
-        braghook.post_brag_to_gist(config, "bragging-rights.md", "message")
+    braghook.post_brag_to_gist(config, "bragging-rights.md", "message")
 
-        mock_connection.assert_not_called()
+    mock_connection.assert_not_called()
 
 
-def test_get_weather_string() -> None:
+def test_get_weather_string(monkeypatch: pytest.MonkeyPatch) -> None:
     config = braghook.Config(
         openweathermap_url="https://api.openweathermap.org/data/2.5/weather"
     )
@@ -292,56 +927,91 @@ def test_get_weather_string() -> None:
     }
     expected_weather_string = "min: 27.0°C, max: 27.0°C, feels like: 27.0°C, humidity: 81%, pressure: 1013hPa\n"  # noqa: E501
 
-    with patch("braghook.braghook._get") as mock_get:
-        mock_get.return_value = weather
-        result = braghook.get_weather_string(config.openweathermap_url)
+    mock_get = MagicMock(return_value=weather)
+    monkeypatch.setattr(braghook, "_get", mock_get)
+
+    result = braghook.get_weather_string(config.openweathermap_url)
 
-        assert result == expected_weather_string
+    assert result == expected_weather_string
 
 
-def test_get_weather_string_no_url() -> None:
+def test_get_weather_string_no_url(monkeypatch: pytest.MonkeyPatch) -> None:
     config = braghook.Config(openweathermap_url="")
 
-    with patch("braghook.braghook._get") as mock_get:
-        result = braghook.get_weather_string(config.openweathermap_url)
+    mock_get = MagicMock()
+    monkeypatch.setattr(braghook, "_get", mock_get)
+
+    result = braghook.get_weather_string(config.openweathermap_url)
 
-        mock_get.assert_not_called()
-        assert result == ""
+    mock_get.assert_not_called()
+    assert result == ""
 
 
-def test_get_weather_empty_response() -> None:
+def test_get_weather_empty_response(monkeypatch: pytest.MonkeyPatch) -> None:
     config = braghook.Config(
         openweathermap_url="https://api.openweathermap.org/data/2.5/weather"
     )
 
-    with patch("braghook.braghook._get") as mock_get:
-        mock_get.return_value = {}
-        result = braghook.get_weather_string(config.openweathermap_url)
+    mock_get = MagicMock(return_value={})
+    monkeypatch.setattr(braghook, "_get", mock_get)
 
-        assert result == ""
+    result = braghook.get_weather_string(config.openweathermap_url)
 
+    assert result == ""
 
-def test_append_weather_to_content_only_once() -> None:
+
+def test_append_weather_to_content_only_once(monkeypatch: pytest.MonkeyPatch) -> None:
     config = braghook.Config(openweathermap_url="https://mock.com/api/openweather")
     weather_string = "min: 27.0°C, max: 27.0°C, feels like: 27.0°C, humidity: 81%, pressure: 1013hPa\n"  # noqa: E501
     content = MOCKFILE_CONTENTS
 
-    with patch("braghook.braghook.get_weather_string") as mock_weather_string:
-        mock_weather_string.return_value = weather_string
-        # Call twice to ensure it only appends once
-        content = braghook.append_weather_to_content(config, content)
-        content = braghook.append_weather_to_content(config, content)
-        print(content)
-        mock_weather_string.assert_called_once()
+    mock_weather_string = MagicMock(return_value=weather_string)
+    monkeypatch.setattr(braghook, "get_weather_string", mock_weather_string)
+
+    # Call twice to ensure it only appends once
+    content = braghook.append_weather_to_content(config, content)
+    content = braghook.append_weather_to_content(config, content)
+    print(content)
+    mock_weather_string.assert_called_once()
+
+
+def test_append_weather_to_content_no_url(monkeypatch: pytest.MonkeyPatch) -> None:
+    config = braghook.Config(openweathermap_url="")
+
+    mock_weather_string = MagicMock()
+    monkeypatch.setattr(braghook, "get_weather_string", mock_weather_string)
+
+    content = braghook.append_weather_to_content(config, MOCKFILE_CONTENTS)
+
+    assert content == MOCKFILE_CONTENTS
+    mock_weather_string.assert_not_called()
+
+
+def test_append_weather_to_content_empty_content(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    config = braghook.Config(openweathermap_url="https://mock.com/api/openweather")
+
+    mock_weather_string = MagicMock(return_value="min: 1.0°C, pressure: 1013hPa\n")
+    monkeypatch.setattr(braghook, "get_weather_string", mock_weather_string)
+
+    content = braghook.append_weather_to_content(config, "")
+
+    assert content == "\nmin: 1.0°C, pressure: 1013hPa\n"
 
 
 @pytest.mark.parametrize(
     "message, expected_title",
-    [
-        ("Test message", ""),
-        ("## Test message", "Test message"),
-        ("## Test message \n Test message body", "Test message"),
-    ],
+    (
+        pytest.param("Test message", "", id="plain"),
+        pytest.param("## Test message", "Test message", id="h2-single-line"),
+        pytest.param(
+            "## Test message \n Test message body",
+            "Test message",
+            id="h2-multi-line",
+        ),
+        pytest.param("##\nTest message", "", id="bare-marker"),
+    ),
 )
 def test_extract_title_from_message(message: str, expected_title: str) -> None:
     assert braghook.extract_title_from_message(message) == expected_title
@@ -354,6 +1024,11 @@ def test_extract_title_from_message(message: str, expected_title: str) -> None:
         ("## Test message", "## Test message"),
         ("- Test message", ":small_blue_diamond: Test message"),
         ("  - Test message", ":small_orange_diamond: Test message"),
+        ("\t*Test message", ":small_orange_diamond: Test message"),
+        (
+            "- Top\n\n  * Nested",
+            ":small_blue_diamond: Top\n\n:small_orange_diamond: Nested",
+        ),
     ],
 )
 def test_bullet_markes_to_diamonds(message: str, expected_message: str) -> None:
@@ -368,6 +1043,7 @@ def test_bullet_markes_to_diamonds(message: str, expected_message: str) -> None:
         ("### Test message", "**Test message**"),
         ("#### Test message", "**Test message**"),
         ("##### Test message", "##### Test message"),  # more than four are not headers
+        ("##\nTest message", "##\nTest message"),  # a header never spans lines
     ],
 )
 def test_headers_to_bold(message: str, expected_message: str) -> None:
@@ -376,40 +1052,82 @@ def test_headers_to_bold(message: str, expected_message: str) -> None:
     assert result == expected_message
 
 
-def test_build_discord_webhook() -> None:
-    # Test the results of the webhook by sending it to a Discord channel
-    # this just tests that nothing raises an exception
-    author = "Test Author"
-    author_icon = "https://example.com/icon.png"
-    message = "Test message"
+@pytest.mark.parametrize("message", HEADER_MESSAGES)
+def test_header_helpers_agree(message: str) -> None:
+    title, text = braghook.extract_title_and_bold_headers(message)
+
+    assert braghook.extract_title_from_message(message) == title
+    assert braghook.headers_to_bold(message) == text
 
-    result = braghook.build_discord_webhook(author, author_icon, message)
 
-    assert result
+@pytest.mark.parametrize(
+    "message, expected",
+    [
+        ("Test message", ("", "Test message")),
+        ("## Test message ", ("Test message", "**Test message **")),
+        ("# Title\n### Sub", ("Title", "**Title**\n**Sub**")),
+    ],
+)
+def test_extract_title_and_bold_headers(
+    message: str,
+    expected: tuple[str, str],
+) -> None:
+    assert braghook.extract_title_and_bold_headers(message) == expected
 
 
-def test_build_plain_discord_webhook() -> None:
-    # Test the results of the webhook by sending it to a Discord channel
+@pytest.mark.parametrize(
+    "message, expected",
+    [
+        ("Test message", ("", "Test message")),
+        ("##### Test message", ("", "##### Test message")),
+        ("##", ("", "##")),
+        ("#\tTitle ", ("Title", "**Title **")),
+        (
+            "## Title\n- item\n  * nested\n### Sub",
+            (
+                "Title",
+                "**Title**\n:small_blue_diamond: item\n"
+                ":small_orange_diamond: nested\n**Sub**",
+            ),
+        ),
+    ],
+)
+def test_format_discord_content(message: str, expected: tuple[str, str]) -> None:
+    assert braghook.format_discord_content(message) == expected
+
+
+@pytest.mark.parametrize(
+    "builder",
+    [
+        braghook.build_discord_webhook,
+        braghook.build_discord_webhook_plain,
+        braghook.build_msteams_webhook,
+    ],
+)
+def test_build_webhook(builder: braghook.Builder) -> None:
+    # Test the results of the webhook by sending it to a channel
     # this just tests that nothing raises an exception
-    author = "Test Author"
-    author_icon = "https://example.com/icon.png"
-    message = "Test message"
+    assert builder(AUTHOR, AUTHOR_ICON, "Test message")
 
-    result = braghook.build_discord_webhook_plain(author, author_icon, message)
 
-    assert result
+def test_build_discord_webhook_bolds_headers_after_bullets() -> None:
+    message = "## Title\n- item"
 
+    result = braghook.build_discord_webhook("author", "", message)
 
-def test_build_msteams_webhook() -> None:
-    # Test the results of the webhook by sending it to a MS Teams channel
-    # this just tests that nothing raises an exception
-    author = "Test Author"
-    author_icon = "https://example.com/icon.png"
-    message = "Test message"
+    assert result["embeds"][0]["title"] == "Title"
+    assert result["embeds"][0]["description"] == (
+        "**Title**\n:small_blue_diamond: item"
+    )
 
-    result = braghook.build_msteams_webhook(author, author_icon, message)
 
-    assert result
+def test_build_plain_discord_webhook() -> None:
+    result = braghook.build_discord_webhook_plain(AUTHOR, AUTHOR_ICON, "Test message")
+
+    assert result == {
+        "username": "braghook",
+        "content": "```Test Author (https://example.com/icon.png)\nTest message```",
+    }
 
 
 def test_parse_args() -> None:
@@ -428,100 +1146,147 @@ def test_parse_args() -> None:
     assert args.config == "tests/braghook.ini"
 
 
-def test_send_brags() -> None:
+def test_parse_args_reuses_parser() -> None:
+    first = braghook.parse_args(["--send"])
+    second = braghook.parse_args([])
+
+    assert braghook._get_parser() is braghook._get_parser()
+    assert first.send is True
+    assert second.send is False
+
+
+def test_send_brags(default_config: braghook.Config) -> None:
     """Assert expected emitter functions are called."""
-    config = braghook.Config()
     with patch.object(braghook, "send_message") as mock_send:
         with patch.object(braghook, "post_brag_to_gist") as mock_post:
-            braghook.send_brags(config, "mock_file", "Mock Content")
+            braghook.send_brags(default_config, "mock_file", "Mock Content")
 
     assert mock_send.call_count == 1
     assert mock_post.call_count == 1
 
 
-def test_main_send_only() -> None:
-    module = "braghook.braghook"
-    # Turn black off to make this more readable and easier to maintain
-    # fmt: off
-    with patch("braghook.braghook.load_config") as load_config, \
-            patch(f"{module}.get_full_filename") as get_full_filename, \
-            patch(f"{module}.open_editor") as open_editor, \
-            patch(f"{module}.read_file_contents") as read_file, \
-            patch(f"{module}.append_weather_to_content") as append_weather_to_content, \
-            patch(f"{module}.send_brags") as send_brags:
-        # fmt: on
-
-        braghook.main(
-            [
-                "--send",
-                *("--config", "tests/bh.ini"),
-                *("--bragfile", "tests/brag.md"),
-            ]
-        )
+def test_send_brags_logs_every_failure(
+    default_config: braghook.Config,
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    with patch.object(braghook, "send_message", side_effect=OSError("hook")):
+        with patch.object(braghook, "post_brag_to_gist", side_effect=OSError("gist")):
+            with pytest.raises(OSError, match="hook"):
+                braghook.send_brags(default_config, "mock_file", "Mock Content")
 
-        load_config.assert_called_once_with("tests/bh.ini")
-        read_file.assert_called_once()
-        get_full_filename.assert_called_once()
-        append_weather_to_content.assert_called_once()
-        send_brags.assert_called_once()
-        open_editor.assert_not_called()
-
-
-def test_main_no_send() -> None:
-    module = "braghook.braghook"
-    # Turn black off to make this more readable and easier to maintain
-    # fmt: off
-    with patch(f"{module}.load_config") as load_config, \
-            patch(f"{module}.get_full_filename") as get_full_filename, \
-            patch(f"{module}.open_editor") as open_editor, \
-            patch(f"{module}.read_file_contents") as read_file, \
-            patch(f"{module}.append_weather_to_content") as append_weather_to_content, \
-            patch(f"{module}.send_brags") as send_brags:
-        # fmt: on
-
-        braghook.main(
-            [
-                *("--config", "tests/braghook.ini"),
-                *("--bragfile", "tests/brag.md"),
-            ]
-        )
+    assert "Error sending to webhooks" in caplog.text
+    assert "Error sending to gist" in caplog.text
 
-        load_config.assert_called_once_with("tests/braghook.ini")
-        get_full_filename.assert_called_once()
-        open_editor.assert_called_once()
-
-        read_file.assert_not_called()
-        append_weather_to_content.assert_not_called()
-        send_brags.assert_not_called()
-
-
-def test_main_create_config() -> None:
-    module = "braghook.braghook"
-    # Turn black off to make this more readable and easier to maintain
-    # Someday 3.9 will go EOL and we can use parenthesis instead of \
-    # fmt: off
-    with patch(f"{module}.create_config") as create_config, \
-            patch(f"{module}.load_config") as load_config, \
-            patch(f"{module}.get_full_filename") as get_full_filename, \
-            patch(f"{module}.open_editor") as open_editor, \
-            patch(f"{module}.read_file_contents") as read_file, \
-            patch(f"{module}.append_weather_to_content") as append_weather_to_content, \
-            patch(f"{module}.send_brags") as send_brags:
-        # fmt: on
-
-        braghook.main(
-            [
-                "--createconfig",
-                *("--config", "tests/braghook.ini"),
-                *("--bragfile", "tests/brag.md"),
-            ]
+
+def test_send_brags_async(default_config: braghook.Config) -> None:
+    import asyncio  # only this test needs the event loop machinery
+
+    with patch.object(braghook, "send_brags") as mock_send:
+        asyncio.run(
+            braghook.send_brags_async(default_config, "mock_file", "Mock Content")
         )
 
-        create_config.assert_called_once()
+    mock_send.assert_called_once_with(default_config, "mock_file", "Mock Content", None)
+
+
+def test_main_send_only(
+    monkeypatch: pytest.MonkeyPatch,
+    main_mocks: dict[str, MagicMock],
+) -> None:
+    main_mocks["read_file_contents"].return_value = MOCKFILE_CONTENTS
+    monkeypatch.setattr(braghook, "get_today", lambda: "2024-01-02")
+
+    braghook.main(
+        [
+            "--send",
+            *("--config", "tests/bh.ini"),
+            *BRAGFILE_ARGS,
+        ]
+    )
+
+    main_mocks["load_config"].assert_called_once_with("tests/bh.ini")
+    main_mocks["read_file_contents"].assert_called_once()
+    main_mocks["get_full_filename"].assert_called_once()
+    main_mocks["append_weather_to_content"].assert_called_once()
+    main_mocks["send_brags"].assert_called_once_with(
+        main_mocks["load_config"].return_value,
+        main_mocks["get_full_filename"].return_value,
+        main_mocks["append_weather_to_content"].return_value,
+        "2024-01-02",
+    )
+    main_mocks["open_editor"].assert_not_called()
+    main_mocks["create_config"].assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "content, expected",
+    [
+        ("", True),
+        (" \n\n", True),
+        (braghook.DEFAULT_FILE_TEMPLATE.format(date="2023-01-01"), True),
+        (braghook.DEFAULT_FILE_TEMPLATE.format(date="2023-01-01") + "- win\n", False),
+        ("### 2023-01-01\n\n- Shipped it", False),
+        (MOCKFILE_CONTENTS, False),
+    ],
+)
+def test_is_empty_brag(content: str, expected: bool) -> None:
+    assert braghook.is_empty_brag(content) is expected
+
+
+@pytest.mark.parametrize(
+    "args, content, expected_calls",
+    [
+        (
+            ["--createconfig"],
+            MOCKFILE_CONTENTS,
+            {"create_config"},
+        ),
+        (
+            [],
+            MOCKFILE_CONTENTS,
+            {"load_config", "get_full_filename", "open_editor"},
+        ),
+        (
+            ["--send"],
+            MOCKFILE_CONTENTS,
+            {
+                "load_config",
+                "get_full_filename",
+                "read_file_contents",
+                "append_weather_to_content",
+                "send_brags",
+            },
+        ),
+        (
+            ["--send"],
+            "   \n",
+            {"load_config", "get_full_filename", "read_file_contents"},
+        ),
+    ],
+)
+def test_main(
+    args: list[str],
+    content: str,
+    expected_calls: set[str],
+    main_mocks: dict[str, MagicMock],
+) -> None:
+    main_mocks["read_file_contents"].return_value = content
+
+    result = braghook.main([*args, *BRAGFILE_ARGS])
+
+    assert result == 0
+    for name, mock in main_mocks.items():
+        assert mock.called is (name in expected_calls), name
+
+
+def test_main_empty_brag_is_not_sent(
+    main_mocks: dict[str, MagicMock],
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    main_mocks["read_file_contents"].return_value = "   \n"
+
+    result = braghook.main(["--send", *BRAGFILE_ARGS])
 
-        load_config.assert_not_called()
-        get_full_filename.assert_not_called()
-        open_editor.assert_not_called()
-        read_file.assert_not_called()
-        append_weather_to_content.assert_not_called()
-        send_brags.assert_not_called()
+    assert result == 0
+    assert "Nothing to send, brag file is empty:" in capsys.readouterr().out
+    main_mocks["send_brags"].assert_not_called()